@@ -0,0 +1,111 @@
+"""
+Content-addressed cache for document analysis results.
+
+Analysis results are stored as JSON blobs keyed by a SHA-256 hash of the document
+markdown, so re-ingesting an unchanged document returns the previous analysis
+without any LLM calls. The cache is disabled unless ANALYSIS_CACHE_CONTAINER is set.
+
+Environment variables:
+  - ANALYSIS_CACHE_CONTAINER: blob container for cached results (enables the cache)
+  - ANALYSIS_CACHE_ACCOUNT_URL: optional blob endpoint; defaults to the Function App storage account
+  - ANALYSIS_CACHE_TTL_SECONDS: optional max age of a cached result (default 30 days)
+"""
+
+import datetime
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Dict, Optional
+
+from azure.core.exceptions import ResourceNotFoundError
+from azure.storage.blob import ContainerClient
+
+from auth import get_default_credential
+
+# Bump when prompts or the analysis schema change so older entries are no longer hit
+ANALYSIS_CACHE_VERSION = "v1"
+
+_CACHE_PREFIX = "analysis_cache"
+_CREATED_AT_METADATA_KEY = "created_at"
+
+# Parsed at import so a malformed value fails loudly instead of disabling every cache hit
+ANALYSIS_CACHE_TTL_SECONDS = int(os.environ.get("ANALYSIS_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+
+_CACHE_CONTAINER_CLIENT: Optional[ContainerClient] = None
+
+
+def get_cache_container_client() -> Optional[ContainerClient]:
+    """Return a cached ContainerClient for the analysis cache, or None when caching is disabled."""
+    global _CACHE_CONTAINER_CLIENT
+    if _CACHE_CONTAINER_CLIENT is not None:
+        return _CACHE_CONTAINER_CLIENT
+
+    container_name = os.environ.get("ANALYSIS_CACHE_CONTAINER")
+    if not container_name:
+        return None
+
+    account_url = os.environ.get("ANALYSIS_CACHE_ACCOUNT_URL")
+    if not account_url:
+        account_name = os.environ.get("AzureWebJobsStorage__accountName")
+        if not account_name:
+            logging.warning("ANALYSIS_CACHE_CONTAINER is set but no storage account is configured; analysis cache disabled")
+            return None
+        account_url = f"https://{account_name}.blob.core.windows.net"
+
+    _CACHE_CONTAINER_CLIENT = ContainerClient(
+        account_url=account_url,
+        container_name=container_name,
+        credential=get_default_credential()
+    )
+    return _CACHE_CONTAINER_CLIENT
+
+
+def compute_cache_key(content: str) -> str:
+    """Return the versioned content hash used as the cache key for a document."""
+    digest = hashlib.sha256(f"{ANALYSIS_CACHE_VERSION}:".encode("utf-8"))
+    digest.update(content.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _blob_name(key: str) -> str:
+    return f"{_CACHE_PREFIX}/{ANALYSIS_CACHE_VERSION}/{key}.json"
+
+
+def get_cached_analysis(key: str) -> Optional[Dict[str, Any]]:
+    """Return a cached analysis result for the key, or None on miss, expiry, or error."""
+    container = get_cache_container_client()
+    if container is None:
+        return None
+
+    try:
+        downloader = container.download_blob(_blob_name(key))
+        created_at = (downloader.properties.metadata or {}).get(_CREATED_AT_METADATA_KEY)
+        if created_at:
+            age = datetime.datetime.now(datetime.timezone.utc) - datetime.datetime.fromisoformat(created_at)
+            if age.total_seconds() > ANALYSIS_CACHE_TTL_SECONDS:
+                logging.info(f"Cached analysis {key} expired")
+                return None
+        return json.loads(downloader.readall())
+    except ResourceNotFoundError:
+        return None
+    except Exception as e:
+        logging.warning(f"Analysis cache lookup failed: {e}")
+        return None
+
+
+def store_analysis(key: str, result: Dict[str, Any]) -> None:
+    """Store an analysis result under the key. Errors are logged and never raised."""
+    container = get_cache_container_client()
+    if container is None:
+        return
+
+    try:
+        container.upload_blob(
+            _blob_name(key),
+            json.dumps(result),
+            overwrite=True,
+            metadata={_CREATED_AT_METADATA_KEY: datetime.datetime.now(datetime.timezone.utc).isoformat()}
+        )
+    except Exception as e:
+        logging.warning(f"Analysis cache write failed: {e}")
@@ -2,8 +2,13 @@
 Centralized prompt templates for document analysis.
 Contains all LLM prompts used across document analysis functions to eliminate duplication
 and provide a single source of truth for prompt engineering.
+
+Invariant: prompt text is static. Generated prompts are memoized and must not vary
+between calls, otherwise Azure OpenAI prompt prefix caching is lost.
 """
 
+from functools import lru_cache
+
 
 class DocumentAnalysisPrompts:
     """Centralized prompt templates for document analysis operations."""
@@ -46,6 +51,7 @@ Do not guess, only return a date if it is explicitly stated in the text or in da
 
     # Individual analysis prompts
     @classmethod
+    @lru_cache(maxsize=16)
     def get_published_date_extraction(cls):
         return f"""You are an expert at extracting publication dates from documents. {cls.PUBLISHED_DATE_BASE}
 
@@ -54,15 +60,79 @@ Do not guess, only return a date if it is explicitly stated in the text or in da
 {cls.PUBLISHED_DATE_RULES}"""
 
     @classmethod
+    @lru_cache(maxsize=16)
     def get_document_type_classification(cls):
         return f"You are an expert document classifier. Analyze the document excerpt and classify its type.\n\n{cls.DOCUMENT_TYPE_CATEGORIES}"
 
     @classmethod
+    @lru_cache(maxsize=16)
     def get_topic_extraction(cls, max_topics: int, content_source: str):
         return f"You are an expert at extracting key topics from documents. Analyze the following document {content_source} and extract the {max_topics} most important topics, themes, or subject areas covered."
 
+    # Extraction guidance shared by the map and reduce phases
+    EXTRACTION_GUIDELINES = """Extraction guidelines:
+- Preserve exact wording, including numbers, units, percentages, currency amounts, and dates
+- Preserve names of people, organizations, products, programs, locations, and systems exactly as written
+- Keep defined terms, acronyms, and their expansions together when both appear in the text
+- Keep requirements, obligations, and restrictions intact, including words such as "must", "shall", "may", and "not"
+- Keep conditions and exceptions attached to the statements they qualify
+- Keep list items and table values that carry key facts; flatten tables into short statements using the original values
+- Prefer statements of findings, conclusions, recommendations, decisions, outcomes, and deadlines
+- Prefer statements that define the scope, purpose, audience, or applicability of the document
+- Prefer statements that identify the author, owner, issuing organization, version, or effective date of the document
+- Prefer statements that describe risks, issues, costs, benefits, impacts, and measured results
+- Prefer statements that describe roles, responsibilities, steps, procedures, and approval requirements
+- Keep quoted material, citations, and references to other documents exactly as written
+- Skip page headers, page footers, page numbers, running titles, and repeated navigation text
+- Skip tables of contents, indexes, revision histories, and boilerplate legal notices unless they carry key facts
+- Skip duplicated sentences; keep only the first occurrence of repeated content
+- Do not merge sentences from different parts of the document into a new sentence
+- Do not add introductions, commentary, headings, or conclusions of your own
+- Do not infer, estimate, or complete missing values
+- If the text contains no meaningful content, return an empty response"""
+
+    # Notes on the markdown layout produced by Document Intelligence
+    SOURCE_FORMAT_NOTES = """Source format notes:
+- The document text is markdown produced by Azure AI Document Intelligence (layout model)
+- Headings are marked with "#" characters; use them to understand structure but do not copy heading markers
+- Tables may appear as HTML <table> elements; read cell values row by row and keep the values exactly as written
+- Figures may appear as <figure> elements with captions; keep captions only when they state key facts
+- Selection marks such as :selected: and :unselected: indicate checkbox states; mention them only when they change the meaning of a statement
+- HTML comments such as <!-- PageHeader="..." --> and <!-- PageFooter="..." --> are layout metadata and are not document content
+- Line breaks inside a paragraph are layout artifacts; treat the paragraph as continuous text
+- Hyphenated words split across lines should be read as a single word
+- Text may contain OCR errors; copy the text as written rather than correcting it"""
+
+    # Static context placed ahead of every map/reduce prompt. Azure OpenAI caches
+    # prompt prefixes of 1024+ tokens, so the map phase (invoked once per chunk) and
+    # the reduce phase share this identical prefix and the variable {text} comes last.
+    SHARED_ANALYSIS_CONTEXT = f"""You are an expert document analyst producing extractive content that will later be used to summarize the document, extract its key topics, classify its type, and identify its publication date.
+
+Summary style: {SUMMARY_INSTRUCTIONS}
+
+Topic coverage: {TOPICS_INSTRUCTIONS}
+
+Document type context - {DOCUMENT_TYPE_CATEGORIES}
+
+Publication date context - {PUBLISHED_DATE_BASE}
+
+{PUBLISHED_DATE_LOCATIONS}
+
+{PUBLISHED_DATE_RULES}
+
+Statements that contain any of the items above should be retained in the extracted content.
+
+{EXTRACTION_GUIDELINES}
+
+{SOURCE_FORMAT_NOTES}"""
+
+    # Minimum prefix size (tokens) Azure OpenAI requires before caching a prompt
+    PROMPT_CACHE_MIN_TOKENS = 1024
+
     # Map-reduce summary extraction templates
-    MAP_EXTRACTION_TEMPLATE = """Extract the most important sentences and key phrases directly from this document section. Use the exact wording from the text - do not paraphrase or rewrite.
+    MAP_EXTRACTION_TEMPLATE = SHARED_ANALYSIS_CONTEXT.replace("{", "{{").replace("}", "}}") + """
+
+Extract the most important sentences and key phrases directly from this document section. Use the exact wording from the text - do not paraphrase or rewrite.
 
 Focus on:
 - Key statements, conclusions, or findings
@@ -76,16 +146,27 @@ Document section:
 
 Extracted Key Content:"""
 
-    REDUCE_COMBINATION_TEMPLATE = """Based on the following extracted content from each document section, create a comprehensive extractive summary by organizing the most important extracted sentences and phrases.
+    REDUCE_COMBINATION_TEMPLATE = SHARED_ANALYSIS_CONTEXT.replace("{", "{{").replace("}", "}}") + f"""
+
+Based on the following extracted content from each document section, produce the structured analysis of the whole document.
 
-Instructions:
+For summary: create a comprehensive extractive summary by organizing the most important extracted sentences and phrases.
 - Use the exact wording from the section extracts provided
 - Organize the content to show overall document flow and key themes
 - Maintain original terminology and phrasing
 - Focus on the most critical extracted information across all sections
 - Do not add new interpretations - only reorganize the extracted content
 
+For key topics: {TOPICS_INSTRUCTIONS}
+
+For document type: classify the document using the document type categories above.
+
+For published date: apply the publication date rules above to the section extracts.
+
 Section extracts:
-{text}
+{{text}}"""
 
-Final Extractive Summary:"""
+    @staticmethod
+    def static_prefix(template: str) -> str:
+        """Return the portion of a template that precedes its first input variable."""
+        return template.split("{text}", 1)[0]
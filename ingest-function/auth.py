@@ -0,0 +1,25 @@
+"""
+Shared Azure credential for the ingest Function App.
+
+DefaultAzureCredential probes several authentication sources on first use and caches
+tokens internally, so a single process-wide instance is shared by every client
+(Document Intelligence, Azure AI Search, Azure OpenAI, Blob Storage). Async SDK
+clients share the aio credential in the same way.
+"""
+
+from functools import lru_cache
+
+from azure.identity import DefaultAzureCredential
+from azure.identity.aio import DefaultAzureCredential as AsyncDefaultAzureCredential
+
+
+@lru_cache(maxsize=1)
+def get_default_credential() -> DefaultAzureCredential:
+    """Return the process-wide DefaultAzureCredential instance."""
+    return DefaultAzureCredential()
+
+
+@lru_cache(maxsize=1)
+def get_default_async_credential() -> AsyncDefaultAzureCredential:
+    """Return the process-wide async DefaultAzureCredential instance for aio clients."""
+    return AsyncDefaultAzureCredential()
@@ -8,26 +8,69 @@ Features:
 - Map-reduce approach for larger documents 
 - Pydantic models ensure type safety and validation
 - Token-aware routing for optimal performance
+- Async entry point (analyze_document_content_async) for non-blocking ingestion
 """
 
+import asyncio
+import hashlib
+import io
 import os
 import logging
 import re
-from typing import Dict, List, Any
-from azure.identity import DefaultAzureCredential, get_bearer_token_provider
+import threading
+from functools import lru_cache
+from typing import Dict, List, Any, Optional, Tuple
+import httpx
+import tiktoken
+from azure.identity import get_bearer_token_provider
+from azure.identity.aio import get_bearer_token_provider as get_async_bearer_token_provider
 
 # LangChain imports
 from langchain_openai import AzureChatOpenAI
 from langchain.prompts import PromptTemplate, ChatPromptTemplate
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.output_parsers import StrOutputParser
 
 # Pydantic for structured outputs
 from pydantic import BaseModel, Field
 
+# Shared Azure credential
+from auth import get_default_async_credential, get_default_credential
+
 # Centralized prompts
 from analysis_prompts import DocumentAnalysisPrompts
 
+# Content-addressed cache for analysis results
+from analysis_cache import compute_cache_key, get_cache_container_client, get_cached_analysis, store_analysis
+
+# Prompt caching requires API version 2024-10-01-preview or later
+DEFAULT_API_VERSION = "2024-10-21"
+
+# Summary returned when structured analysis fails (never cached)
+ANALYSIS_FAILED_SUMMARY = "Analysis failed"
+
+# Documents below this token count skip LLM analysis and use their raw text as the summary
+MIN_ANALYSIS_TOKENS = 50
+
+# Maximum number of concurrent map-phase requests for large documents
+MAP_CONCURRENCY = int(os.environ.get("MAP_CONCURRENCY", "8"))
+
+# Map-phase chunking (tokens). Boundaries snap to paragraph/line breaks, so no overlap is needed
+MAP_CHUNK_SIZE = int(os.environ.get("MAP_CHUNK_SIZE", "16000"))
+MAP_CHUNK_OVERLAP = int(os.environ.get("MAP_CHUNK_OVERLAP", "0"))
+if MAP_CHUNK_SIZE <= 0:
+    raise ValueError(f"MAP_CHUNK_SIZE must be positive, got {MAP_CHUNK_SIZE}")
+if not 0 <= MAP_CHUNK_OVERLAP < MAP_CHUNK_SIZE:
+    raise ValueError(
+        f"MAP_CHUNK_OVERLAP must be non-negative and smaller than MAP_CHUNK_SIZE ({MAP_CHUNK_SIZE}), got {MAP_CHUNK_OVERLAP}"
+    )
+
+
+# Separators used to snap chunk boundaries, in order of preference: paragraph break, line
+# break, then sentence punctuation followed by whitespace (so "3.14" or "report.pdf" is not a cut)
+_CHUNK_SEPARATORS = (re.compile(rb"\n\n"), re.compile(rb"\n"), re.compile(rb"[.?!](?=\s)"))
+# Number of tokens before a hard boundary searched for a separator
+_CHUNK_SNAP_WINDOW = 512
+
 
 # Pydantic models for structured outputs
 class DocumentAnalysis(BaseModel):
@@ -49,64 +92,153 @@ class DocumentAnalysis(BaseModel):
 
 """
 Simplified: We keep one structured output (DocumentAnalysis) and use it for all
-paths. For large documents we first produce an extractive map-reduce summary and
-then run the structured analysis on that summary to derive topics/type/date.
+paths. For large documents the map phase extracts key content per chunk and the
+reduce phase produces the structured analysis directly from those extracts.
 """
 
 
+_LLM_CLIENT: Optional[AzureChatOpenAI] = None
+_LLM_CLIENT_LOCK = threading.Lock()
+
+
 def get_azure_openai_client() -> AzureChatOpenAI:
     """
-    Create Azure OpenAI client using managed identity authentication.
+    Return a cached Azure OpenAI client using managed identity authentication.
+    The credential and token provider are created once so their token cache and
+    the client's connection pool are reused across documents.
     
     Returns:
         AzureChatOpenAI: Configured client for Azure OpenAI
     """
-    endpoint = os.environ.get("AZURE_OPENAI_ENDPOINT")
-    deployment_name = os.environ.get("AZURE_OPENAI_DEPLOYMENT_NAME") 
-    api_version = os.environ.get("AZURE_OPENAI_API_VERSION", "2024-10-21")
-    
-    if not endpoint:
-        raise ValueError("AZURE_OPENAI_ENDPOINT environment variable is required")
-    if not deployment_name:
-        raise ValueError("AZURE_OPENAI_DEPLOYMENT_NAME environment variable is required")
-    
-    # Create token provider using managed identity
-    credential = DefaultAzureCredential()
-    token_provider = get_bearer_token_provider(
-        credential, 
-        "https://cognitiveservices.azure.com/.default"
-    )
-    
-    # Create Azure OpenAI client
-    return AzureChatOpenAI(
-        azure_endpoint=endpoint,
-        azure_deployment=deployment_name,
-        api_version=api_version,
-        azure_ad_token_provider=token_provider,
-        temperature=0.3,  # Low temperature for consistent analysis
-        max_tokens=4000   # Allow for detailed summaries
-    )
+    global _LLM_CLIENT
+    if _LLM_CLIENT is not None:
+        return _LLM_CLIENT
 
+    with _LLM_CLIENT_LOCK:
+        if _LLM_CLIENT is not None:
+            return _LLM_CLIENT
+
+        endpoint = os.environ.get("AZURE_OPENAI_ENDPOINT")
+        deployment_name = os.environ.get("AZURE_OPENAI_DEPLOYMENT_NAME") 
+        api_version = os.environ.get("AZURE_OPENAI_API_VERSION", DEFAULT_API_VERSION)
+        
+        if not endpoint:
+            raise ValueError("AZURE_OPENAI_ENDPOINT environment variable is required")
+        if not deployment_name:
+            raise ValueError("AZURE_OPENAI_DEPLOYMENT_NAME environment variable is required")
+        
+        # Checked on first client use rather than at import, so a tokenizer download
+        # failure cannot break module import
+        _check_prompt_cache_prefixes()
 
-def generate_single_shot_analysis(content: str, llm: AzureChatOpenAI) -> Dict[str, Any]:
+        # Create token providers using managed identity; the async provider keeps token
+        # acquisition for ainvoke/abatch off the blocking credential chain
+        scope = "https://cognitiveservices.azure.com/.default"
+        token_provider = get_bearer_token_provider(get_default_credential(), scope)
+        async_token_provider = get_async_bearer_token_provider(get_default_async_credential(), scope)
+        
+        # Create Azure OpenAI client
+        _LLM_CLIENT = AzureChatOpenAI(
+            azure_endpoint=endpoint,
+            azure_deployment=deployment_name,
+            api_version=api_version,
+            azure_ad_token_provider=token_provider,
+            azure_ad_async_token_provider=async_token_provider,
+            temperature=0.3,  # Low temperature for consistent analysis
+            max_tokens=4000,  # Allow for detailed summaries
+            max_retries=2,
+            # Shared async connection pool for concurrent ainvoke/abatch calls
+            http_async_client=httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=50, max_keepalive_connections=20)
+            )
+        )
+        return _LLM_CLIENT
+
+
+@lru_cache(maxsize=1)
+def get_token_encoding() -> tiktoken.Encoding:
+    """Return the shared cl100k_base encoding (loaded once per process)."""
+    return tiktoken.get_encoding("cl100k_base")
+
+
+def _ends_on_char_boundary(encoding: tiktoken.Encoding, tokens: List[int], index: int) -> bool:
+    """Return True if the bytes of tokens[:index] end on a complete UTF-8 character."""
+    # Every token is at least one byte, so the last 4 tokens cover any UTF-8 sequence
+    tail = b"".join(encoding.decode_tokens_bytes(tokens[max(0, index - 4):index]))
+    for back in range(1, min(4, len(tail)) + 1):
+        byte = tail[-back]
+        if byte & 0xC0 != 0x80:  # lead or ASCII byte
+            needed = 1 if byte < 0xC0 else 2 if byte < 0xE0 else 3 if byte < 0xF0 else 4
+            return back >= needed
+    return True
+
+
+def split_text_by_tokens(
+    content: str,
+    chunk_size: int,
+    chunk_overlap: int,
+    token_ids: Optional[List[int]] = None
+) -> List[str]:
     """
-    Generate complete document analysis in one shot for content under 100K tokens.
-    Uses structured outputs with Pydantic schemas for reliable parsing.
+    Split content into chunks of at most chunk_size tokens using a single encode pass.
+    Boundaries are snapped back to the nearest paragraph break, line break, or sentence
+    end within the last _CHUNK_SNAP_WINDOW tokens of each chunk when one is available.
     
     Args:
-        content: Full document content
-        llm: Azure OpenAI client
+        content: Text to split
+        chunk_size: Maximum tokens per chunk
+        chunk_overlap: Tokens shared between consecutive chunks
+        token_ids: Optional precomputed cl100k_base token ids for content
         
     Returns:
-        Dictionary with summary, key_topics, and document_type
+        List of chunk strings
     """
-    try:
-        # Create structured LLM with Pydantic schema
-        structured_llm = llm.with_structured_output(DocumentAnalysis)
-        
-        # Create the prompt using ChatPromptTemplate for better control
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", f"""You are an expert document analyst. Your task is to analyze documents and provide structured analysis.
+    encoding = get_token_encoding()
+    tokens = token_ids if token_ids is not None else encoding.encode_ordinary(content)
+    total = len(tokens)
+
+    chunks: List[str] = []
+    start = 0
+    while start < total:
+        end = min(start + chunk_size, total)
+        if end < total:
+            window_start = max(start + 1, end - _CHUNK_SNAP_WINDOW)
+            window = encoding.decode_tokens_bytes(tokens[window_start:end])
+            window_bytes = b"".join(window)
+            for separator in _CHUNK_SEPARATORS:
+                last_match = None
+                for last_match in separator.finditer(window_bytes):
+                    pass
+                if last_match is not None:
+                    # Cut after the token holding the separator's last byte; separators
+                    # like ". " often span two tokens
+                    offset = 0
+                    for j, token_bytes in enumerate(window):
+                        offset += len(token_bytes)
+                        if offset >= last_match.end():
+                            end = window_start + j + 1
+                            break
+                    break
+            # A hard cut can split a multi-byte character across two tokens; move it back
+            # to the nearest character boundary if the chunk has one
+            boundary = end
+            while boundary > start + 1 and not _ends_on_char_boundary(encoding, tokens, boundary):
+                boundary -= 1
+            if _ends_on_char_boundary(encoding, tokens, boundary):
+                end = boundary
+        chunks.append(encoding.decode(tokens[start:end]))
+        if end >= total:
+            break
+        start = max(end - chunk_overlap, start + 1)
+        while start < end and not _ends_on_char_boundary(encoding, tokens, start):
+            start += 1
+    return chunks
+
+
+# Built once at import so the system prefix is byte-identical across calls. Azure
+# OpenAI caches prompt prefixes of 1024+ tokens, so keeping the static instructions
+# first and the document ({content}) last lets every call after the first reuse it.
+_ANALYSIS_SYSTEM_PROMPT = f"""You are an expert document analyst. Your task is to analyze documents and provide structured analysis.
 
 {DocumentAnalysisPrompts.get_published_date_extraction()}
 
@@ -114,154 +246,282 @@ def generate_single_shot_analysis(content: str, llm: AzureChatOpenAI) -> Dict[st
 
 For key topics: {DocumentAnalysisPrompts.TOPICS_INSTRUCTIONS}
 
-For summary: {DocumentAnalysisPrompts.SUMMARY_INSTRUCTIONS}"""),
-            ("human", "Please analyze the following document:\n\n{content}")
-        ])
-        
-        # Create the chain and invoke
-        chain = prompt | structured_llm
-        result = chain.invoke({"content": content})
-        
-        # Convert Pydantic model to dictionary
-        return {
-            "summary": result.summary,
-            "key_topics": result.key_topics,
-            "document_type": result.document_type,
-            "published_date": result.published_date
-        }
-        
+For summary: {DocumentAnalysisPrompts.SUMMARY_INSTRUCTIONS}"""
+
+# Fingerprint makes any drift in the cached system prefix visible in debug logs
+logging.debug(
+    f"Analysis system prompt sha256={hashlib.sha256(_ANALYSIS_SYSTEM_PROMPT.encode('utf-8')).hexdigest()[:16]}"
+)
+
+_ANALYSIS_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", _ANALYSIS_SYSTEM_PROMPT),
+    ("human", "Please analyze the following document:\n\n{content}")
+])
+
+# Map/reduce prompts share a static prefix (DocumentAnalysisPrompts.SHARED_ANALYSIS_CONTEXT)
+# and end with {text}, so every chunk after the first hits the prompt cache.
+_MAP_PROMPT = PromptTemplate(template=DocumentAnalysisPrompts.MAP_EXTRACTION_TEMPLATE, input_variables=["text"])
+_REDUCE_PROMPT = PromptTemplate(template=DocumentAnalysisPrompts.REDUCE_COMBINATION_TEMPLATE, input_variables=["text"])
+
+
+@lru_cache(maxsize=1)
+def _check_prompt_cache_prefixes() -> None:
+    """Warn once if a map/reduce static prefix is below the prompt caching threshold (in cl100k tokens)."""
+    try:
+        encoding = get_token_encoding()
     except Exception as e:
-        logging.error(f"Structured output analysis failed: {e}")
-        # Return minimal error response
-        return {
-            "summary": "Analysis failed",
-            "key_topics": [],
-            "document_type": "Unknown",
-            "published_date": "00-00-0000"
-        }
+        logging.warning(f"Skipping prompt cache prefix check, tokenizer unavailable: {e}")
+        return
+    for name, template in (
+        ("MAP_EXTRACTION_TEMPLATE", DocumentAnalysisPrompts.MAP_EXTRACTION_TEMPLATE),
+        ("REDUCE_COMBINATION_TEMPLATE", DocumentAnalysisPrompts.REDUCE_COMBINATION_TEMPLATE),
+    ):
+        prefix_tokens = len(encoding.encode_ordinary(DocumentAnalysisPrompts.static_prefix(template)))
+        if prefix_tokens < DocumentAnalysisPrompts.PROMPT_CACHE_MIN_TOKENS:
+            logging.warning(f"{name} static prefix is {prefix_tokens} tokens, below the prompt caching threshold")
+
+
+def _analysis_to_dict(result: DocumentAnalysis) -> Dict[str, Any]:
+    """Convert a structured DocumentAnalysis result to a dictionary (Pydantic v2)."""
+    return result.model_dump()
+
 
+def _failed_analysis_result() -> Dict[str, Any]:
+    """Minimal analysis returned when a structured analysis call fails."""
+    return {
+        "summary": ANALYSIS_FAILED_SUMMARY,
+        "key_topics": [],
+        "document_type": "Unknown",
+        "published_date": "00-00-0000"
+    }
 
-def generate_map_reduce_summary(content: str, llm: AzureChatOpenAI, total_tokens: int) -> str:
+
+async def generate_single_shot_analysis_async(content: str, llm: AzureChatOpenAI) -> Dict[str, Any]:
     """
-    Generate summary using map-reduce approach for large documents (>= 100K tokens).
-    Uses LangChain's RecursiveCharacterTextSplitter for intelligent token-based chunking.
+    Generate complete document analysis in one shot for content under 100K tokens.
+    Uses structured outputs with Pydantic schemas for reliable parsing.
     
     Args:
-        content: Full document content  
+        content: Full document content
         llm: Azure OpenAI client
-        total_tokens: Total token count for the document
         
     Returns:
-        Generated summary
+        Dictionary with summary, key_topics, and document_type
     """
+    try:
+        # Create the chain from the shared prompt and structured LLM, then invoke
+        chain = _ANALYSIS_PROMPT | llm.with_structured_output(DocumentAnalysis)
+        return _analysis_to_dict(await chain.ainvoke({"content": content}))
+    except Exception as e:
+        logging.error(f"Structured output analysis failed: {e}")
+        return _failed_analysis_result()
+
+
+def _map_inputs(content: str, total_tokens: int, token_ids: Optional[List[int]]) -> List[Dict[str, str]]:
+    """Build the map-phase inputs, chunking content when it exceeds 100K tokens."""
     # Decide whether to chunk the content or use it as-is
     if total_tokens > 100000:
         # Split into practical token-sized chunks before map-reduce
-        logging.info(
-            f"Splitting {total_tokens} tokens using RecursiveCharacterTextSplitter (token-based)"
-        )
-        text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-            encoding_name="cl100k_base",
-            chunk_size=50000,
-            chunk_overlap=500,
-            separators=["\n\n", "\n", ". ", "? ", "! ", " ", ""]
+        logging.info(f"Splitting {total_tokens} tokens into token-based chunks")
+        content_chunks = split_text_by_tokens(
+            content, chunk_size=MAP_CHUNK_SIZE, chunk_overlap=MAP_CHUNK_OVERLAP, token_ids=token_ids
         )
-        content_chunks = text_splitter.split_text(content)
     else:
         # Use content as single chunk for smaller documents
         content_chunks = [content]
+    return [{"text": chunk} for chunk in content_chunks]
+
+
+def _combine_section_extracts(results: List[Any]) -> str:
+    """Combine map-phase results (strings or exceptions) into the reduce-phase input."""
+    # Write each section straight into one buffer and release its result
+    combined = io.StringIO()
+    for i, summary in enumerate(results, 1):
+        if i > 1:
+            combined.write("\n\n")
+        if isinstance(summary, Exception):
+            logging.warning(f"Failed to summarize chunk {i}: {summary}")
+            # Include chunk without summary as fallback
+            combined.write(f"Section {i}: [Summary generation failed]")
+        else:
+            combined.write(f"Section {i}: {summary.strip()}")
+        results[i - 1] = None
+    combined_summaries = combined.getvalue()
+    combined.close()
+    return combined_summaries
+
+
+async def generate_map_reduce_analysis_async(
+    content: str,
+    llm: AzureChatOpenAI,
+    total_tokens: int,
+    token_ids: Optional[List[int]] = None
+) -> Dict[str, Any]:
+    """
+    Generate complete document analysis using map-reduce for large documents (>= 100K tokens).
+    Uses a single tiktoken encode pass for token-based chunking; the reduce phase
+    returns structured output so no separate single-shot pass is needed.
     
-    # Map phase: Summarize each chunk using modern pipe operator
-    map_prompt = PromptTemplate(template=DocumentAnalysisPrompts.MAP_EXTRACTION_TEMPLATE, input_variables=["text"])
-    parser = StrOutputParser()
-    map_chain = map_prompt | llm | parser
+    Args:
+        content: Full document content  
+        llm: Azure OpenAI client
+        total_tokens: Total token count for the document
+        token_ids: Optional precomputed token ids for content, reused for chunking
+        
+    Returns:
+        Dictionary with summary, key_topics, document_type, and published_date
+    """
+    # Map phase: Summarize each chunk concurrently; failures come back as exception instances
+    map_chain = _MAP_PROMPT | llm | StrOutputParser()
+    results = await map_chain.abatch(
+        _map_inputs(content, total_tokens, token_ids),
+        config={"max_concurrency": MAP_CONCURRENCY},
+        return_exceptions=True
+    )
     
-    # Generate chunk summaries
-    chunk_summaries = []
-    for i, chunk in enumerate(content_chunks, 1):
-        try:
-            summary = map_chain.invoke({"text": chunk})
-            chunk_summaries.append(f"Section {i}: {summary.strip()}")
-        except Exception as e:
-            logging.warning(f"Failed to summarize chunk {i}: {e}")
-            # Include chunk without summary as fallback
-            chunk_summaries.append(f"Section {i}: [Summary generation failed]")
+    # Reduce phase: Combine chunk summaries into the structured analysis
+    reduce_chain = _REDUCE_PROMPT | llm.with_structured_output(DocumentAnalysis)
+    try:
+        return _analysis_to_dict(await reduce_chain.ainvoke({"text": _combine_section_extracts(results)}))
+    except Exception as e:
+        logging.error(f"Structured reduce analysis failed: {e}")
+        return _failed_analysis_result()
+
+
+def _prepare_document_analysis(
+    full_markdown: str, pages: List[Dict[str, Any]], total_tokens: int
+) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    Run the pre-LLM steps of document analysis.
     
-    # Reduce phase: Combine chunk summaries into final summary using modern pipe operator
-    reduce_prompt = PromptTemplate(template=DocumentAnalysisPrompts.REDUCE_COMBINATION_TEMPLATE, input_variables=["text"])
-    reduce_chain = reduce_prompt | llm | parser
+    Returns:
+        (early_result, cache_key) where early_result is a cached or skipped-small
+        result that should be returned without calling the LLM, and cache_key is
+        None when the analysis cache is disabled
+    """
+    # Covers, title pages, and empty documents are not worth an LLM round-trip (checked
+    # before the cache so they never pay for hashing or a blob lookup)
+    if total_tokens < MIN_ANALYSIS_TOKENS or not pages:
+        logging.info(f"Skipping LLM analysis for small document ({total_tokens} tokens)")
+        return {
+            "total_pages": len(pages),
+            "total_tokens": total_tokens,
+            # Page content has Document Intelligence's page metadata comments removed
+            "summary": "\n\n".join(page["markdown_content"] for page in pages),
+            "key_topics": [],
+            "document_type": "Unknown",
+            "published_date": "00-00-0000",
+            "analysis_status": "skipped_small"
+        }, None
+
+    # Re-ingested documents with unchanged content reuse their previous analysis
+    cache_key: Optional[str] = None
+    if get_cache_container_client() is not None:
+        cache_key = compute_cache_key(full_markdown)
+        cached_result = get_cached_analysis(cache_key)
+        if cached_result is not None:
+            logging.info(f"Using cached document analysis {cache_key}")
+            return cached_result, cache_key
+
+    return None, cache_key
+
+
+def _page_token_total(pages: List[Dict[str, Any]], page_token_total: Optional[int]) -> int:
+    """Return the precomputed page token total, summing page token counts if it was not given."""
+    if page_token_total is None:
+        return sum(page.get("token_count", 0) for page in pages)
+    return page_token_total
+
+
+def _finalize_document_analysis(
+    analysis_result: Dict[str, Any], total_pages: int, total_tokens: int, cache_key: Optional[str]
+) -> Dict[str, Any]:
+    """Build the document-level analysis from an LLM result and cache it on success."""
+    summary = _clean_summary_text(analysis_result.get("summary"))
+    key_topics = analysis_result.get("key_topics", [])
+    document_type = analysis_result.get("document_type", "Unknown")
+    published_date = analysis_result.get("published_date", "00-00-0000")
     
-    # Combine all chunk summaries
-    combined_summaries = "\n\n".join(chunk_summaries)
-    final_summary = reduce_chain.invoke({"text": combined_summaries})
+    document_analysis = {
+        "total_pages": total_pages,
+        "total_tokens": total_tokens,
+        "summary": summary,
+        "key_topics": key_topics,
+        "document_type": document_type,
+        "published_date": published_date,
+        "analysis_status": "success"
+    }
+    if cache_key is not None and summary != ANALYSIS_FAILED_SUMMARY:
+        store_analysis(cache_key, document_analysis)
+    return document_analysis
 
-    # Sanitize quotes and ensure a single aggregated summary without extraneous quoting
-    return _clean_summary_text(final_summary)
 
+def _failed_document_analysis(
+    pages: List[Dict[str, Any]], error: Exception, page_token_total: Optional[int] = None
+) -> Dict[str, Any]:
+    """Return basic metrics with error info when document analysis fails."""
+    logging.error(f"Document analysis failed: {error}")
+    return {
+        "total_pages": len(pages),
+        "total_tokens": _page_token_total(pages, page_token_total),
+        "summary": None,
+        "key_topics": [],
+        "document_type": "Unknown",
+        "published_date": "00-00-0000",
+        "analysis_status": "failed",
+        "error": str(error)
+    }
 
-def analyze_document_content(full_markdown: str, pages: List[Dict[str, Any]]) -> Dict[str, Any]:
+
+async def analyze_document_content_async(
+    full_markdown: str,
+    pages: List[Dict[str, Any]],
+    page_token_total: Optional[int] = None
+) -> Dict[str, Any]:
     """
     Analyze document content and generate document-level attributes.
+    LLM calls use ainvoke/abatch and the blocking cache and tokenizer work runs in a
+    worker thread, so the event loop can serve other requests while a document is
+    being analyzed.
     
     Args:
         full_markdown: Complete markdown content from Document Intelligence
         pages: List of page objects with token counts
+        page_token_total: Optional precomputed sum of page token counts; routes single-shot
+            vs map-reduce analysis and is reported as total_tokens
         
     Returns:
         Document-level analysis including summary, topics, etc.
         Returns error info if analysis fails but doesn't raise exceptions.
     """
     try:
-        # Calculate total metrics
         total_pages = len(pages)
-        total_tokens = sum(page["token_count"] for page in pages)
-        
-        # Get Azure OpenAI client
+        total_tokens = _page_token_total(pages, page_token_total)
+        early_result, cache_key = await asyncio.to_thread(
+            _prepare_document_analysis, full_markdown, pages, total_tokens
+        )
+        if early_result is not None:
+            return early_result
+
         llm = get_azure_openai_client()
         
-        # Determine analysis strategy based on token count
         if total_tokens < 100000:
             logging.info(f"Using single-shot structured analysis for {total_tokens} tokens")
-            analysis_result = generate_single_shot_analysis(full_markdown, llm)
+            analysis_result = await generate_single_shot_analysis_async(full_markdown, llm)
         else:
-            logging.info(
-                f"Using map-reduce to produce extractive summary, then single structured analysis for {total_tokens} tokens"
-            )
-            summary_text = generate_map_reduce_summary(full_markdown, llm, total_tokens)
-            analysis_result = generate_single_shot_analysis(summary_text, llm)
-
-        summary = analysis_result.get("summary")
-        if isinstance(summary, str):
-            summary = _clean_summary_text(summary)
-        key_topics = analysis_result.get("key_topics", [])
-        document_type = analysis_result.get("document_type", "Unknown")
-        published_date = analysis_result.get("published_date", "00-00-0000")
-        
-        return {
-            "total_pages": total_pages,
-            "total_tokens": total_tokens,
-            "summary": summary,
-            "key_topics": key_topics,
-            "document_type": document_type,
-            "published_date": published_date,
-            "analysis_status": "success"
-        }
+            logging.info(f"Using map-reduce structured analysis for {total_tokens} tokens")
+            token_ids = await asyncio.to_thread(get_token_encoding().encode_ordinary, full_markdown)
+            analysis_result = await generate_map_reduce_analysis_async(full_markdown, llm, len(token_ids), token_ids)
+
+        return await asyncio.to_thread(
+            _finalize_document_analysis, analysis_result, total_pages, total_tokens, cache_key
+        )
         
     except Exception as e:
-        logging.error(f"Document analysis failed: {e}")
-        # Return basic metrics with error info
-        return {
-            "total_pages": len(pages),
-            "total_tokens": sum(page.get("token_count", 0) for page in pages),
-            "summary": None,
-            "key_topics": [],
-            "document_type": "Unknown",
-            "published_date": "00-00-0000",
-            "analysis_status": "failed",
-            "error": str(e)
-        }
+        return _failed_document_analysis(pages, e, page_token_total)
 
 
+_MULTI_NEWLINE_RE = re.compile(r"\n{3,}")
 def _clean_summary_text(text: str) -> str:
     """Clean up LLM-produced summaries by removing extraneous quotes and
     normalizing any remaining quotes to single quotes.
@@ -300,5 +560,5 @@ def _clean_summary_text(text: str) -> str:
 
     s = "\n".join(cleaned_lines)
     # Collapse 3+ newlines to max 2
-    s = re.sub(r"\n{3,}", "\n\n", s)
+    s = _MULTI_NEWLINE_RE.sub("\n\n", s)
     return s.strip()
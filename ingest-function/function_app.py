@@ -1,19 +1,22 @@
 import azure.functions as func
+import asyncio
+import base64
 import datetime
-import json
 import logging
 import os
-import io
 import re
 import hashlib
+import itertools
 import urllib.parse
-from typing import List, Dict, Any, Optional
-import tiktoken
+import uuid
+from functools import lru_cache
+from typing import Iterator, List, Dict, Any, Optional, Tuple
+import orjson
 
-from azure.ai.documentintelligence import DocumentIntelligenceClient
-from azure.identity import DefaultAzureCredential
+from azure.ai.documentintelligence.aio import DocumentIntelligenceClient as AsyncDocumentIntelligenceClient
 from azure.core.credentials import AzureKeyCredential
 from azure.core.exceptions import AzureError
+from auth import get_default_async_credential
 from search_utils import (
     get_search_client,
     chunk_documents_for_indexing,
@@ -22,14 +25,30 @@ from search_utils import (
 )
 
 # Import document analysis utilities
-from document_analysis import analyze_document_content
+from document_analysis import analyze_document_content_async, get_token_encoding
 
 app = func.FunctionApp()
 
-_DOC_INTEL_CLIENT: Optional[DocumentIntelligenceClient] = None
+_DOC_INTEL_CLIENT: Optional[AsyncDocumentIntelligenceClient] = None
 
-def get_document_intelligence_client() -> DocumentIntelligenceClient:
-    """Return a cached Document Intelligence client. Prefer Managed Identity, fallback to key."""
+# Fallback document IDs (no source URL) are unique per process start and call order; the
+# random suffix keeps scaled-out instances started in the same second from colliding
+_FALLBACK_ID_PREFIX = (
+    datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%d_%H%M%S") + "_" + uuid.uuid4().hex[:8]
+)
+_FALLBACK_ID_COUNTER = itertools.count()
+
+# Azure OpenAI embedding batch limits, with a buffer under 8,191 tokens and 2,048 inputs
+EMBEDDING_BATCH_MAX_TOKENS = 7500
+EMBEDDING_BATCH_MAX_ITEMS = 2000
+
+# Document Intelligence markdown page markers, compiled once
+_PAGE_BREAK_MARKER = '<!-- PageBreak -->'
+_PAGE_NUMBER_RE = re.compile(r'<!-- PageNumber="(\d+)" -->')
+_PAGE_METADATA_RE = re.compile(r'<!-- (?:PageNumber|PageHeader|PageFooter)="[^"]*" -->\s*')
+
+def get_document_intelligence_client() -> AsyncDocumentIntelligenceClient:
+    """Return a cached async Document Intelligence client. Prefer Managed Identity, fallback to key."""
     global _DOC_INTEL_CLIENT
     if _DOC_INTEL_CLIENT is not None:
         return _DOC_INTEL_CLIENT
@@ -39,8 +58,8 @@ def get_document_intelligence_client() -> DocumentIntelligenceClient:
         raise ValueError("DOC_INTEL_ENDPOINT environment variable is required")
 
     try:
-        credential = DefaultAzureCredential()
-        _DOC_INTEL_CLIENT = DocumentIntelligenceClient(endpoint=endpoint, credential=credential)
+        credential = get_default_async_credential()
+        _DOC_INTEL_CLIENT = AsyncDocumentIntelligenceClient(endpoint=endpoint, credential=credential)
         return _DOC_INTEL_CLIENT
     except Exception as e:
         logging.warning(f"Managed Identity authentication failed: {e}")
@@ -48,7 +67,7 @@ def get_document_intelligence_client() -> DocumentIntelligenceClient:
     key = os.environ.get("DOCUMENT_INTELLIGENCE_KEY")
     if key:
         credential = AzureKeyCredential(key)
-        _DOC_INTEL_CLIENT = DocumentIntelligenceClient(endpoint=endpoint, credential=credential)
+        _DOC_INTEL_CLIENT = AsyncDocumentIntelligenceClient(endpoint=endpoint, credential=credential)
         return _DOC_INTEL_CLIENT
 
     raise ValueError(
@@ -59,7 +78,7 @@ def get_document_intelligence_client() -> DocumentIntelligenceClient:
 def http_json(data: Any, status_code: int = 200) -> func.HttpResponse:
     """Create a JSON HttpResponse with consistent headers."""
     return func.HttpResponse(
-        json.dumps(data),
+        orjson.dumps(data),
         status_code=status_code,
         mimetype="application/json",
     )
@@ -70,6 +89,20 @@ def http_error(message: str, status_code: int) -> func.HttpResponse:
     return http_json({"error": message}, status_code)
 
 
+@lru_cache(maxsize=4096)
+def _normalize_url(source_url: str) -> str:
+    """Normalize a source URL for hashing (cached; retries and re-ingests repeat URLs)."""
+    parsed = urllib.parse.urlparse(source_url.lower().strip())
+    return urllib.parse.urlunparse((
+        parsed.scheme,
+        parsed.netloc,
+        parsed.path.rstrip('/'),
+        '',  # Remove params
+        parsed.query,
+        ''   # Remove fragment
+    ))
+
+
 def generate_base_document_id(source_url: Optional[str] = None, max_length: int = 1024) -> str:
     """
     Generate the base document ID from source URL (without page/chunk info).
@@ -88,23 +121,17 @@ def generate_base_document_id(source_url: Optional[str] = None, max_length: int
     """
     if source_url:
         # Normalize the URL for consistent hashing
-        parsed = urllib.parse.urlparse(source_url.lower().strip())
-        normalized_url = urllib.parse.urlunparse((
-            parsed.scheme,
-            parsed.netloc,
-            parsed.path.rstrip('/'),
-            '',  # Remove params
-            parsed.query,
-            ''   # Remove fragment
-        ))
+        normalized_url = _normalize_url(source_url)
         
-        # Create hash of normalized URL (using full hash for zero collision risk)
-        url_hash = hashlib.sha256(normalized_url.encode('utf-8')).hexdigest()
+        # Create 128-bit BLAKE2b hash of normalized URL, URL-safe base64 encoded (22 chars)
+        url_hash = base64.urlsafe_b64encode(
+            hashlib.blake2b(normalized_url.encode('utf-8'), digest_size=16).digest()
+        ).rstrip(b'=').decode('ascii')
         base_document_id = f"doc_{url_hash}"
     else:
-        # Fallback for when no URL is provided
-        timestamp = datetime.datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        base_document_id = f"doc_{timestamp}"
+        # Fallback for when no URL is provided: process start time and instance suffix plus
+        # a counter, unique without a clock read per call
+        base_document_id = f"doc_{_FALLBACK_ID_PREFIX}_{next(_FALLBACK_ID_COUNTER)}"
     
     # Ensure it meets Azure AI Search requirements
     if len(base_document_id) > max_length:
@@ -149,60 +176,21 @@ def generate_chunk_id_from_base(base_document_id: str, page_number: int = 1, max
     return document_id
 
 
-def count_tokens(text: str) -> int:
+def count_tokens_batch(texts: List[str]) -> List[int]:
     """
-    Count tokens for embedding models using tiktoken.
-    Uses cl100k_base encoding which is compatible with all Azure OpenAI embedding models.
+    Count tokens for embedding models using tiktoken, for many texts in one call.
+    Uses cl100k_base encoding which is compatible with all Azure OpenAI embedding models;
+    tiktoken encodes the batch across threads in its native core.
     """
     try:
-        tokenizer = tiktoken.get_encoding("cl100k_base")
-        return len(tokenizer.encode(text))
+        # Cached once loaded; a failed load is retried on the next call
+        encoding = get_token_encoding()
     except Exception as e:
-        logging.warning(f"Token counting failed: {e}")
+        logging.warning(f"Tokenizer unavailable, using approximate token counts: {e}")
         # Fallback approximation: ~4 characters per token for English text
-        return len(text) // 4
-
-
-def group_pages_for_batch_embedding(
-    pages: List[Dict[str, Any]], 
-    max_tokens_per_batch: int = 7500,  # Buffer under 8,191 limit
-    max_items_per_batch: int = 2000    # Buffer under 2048 limit
-) -> List[Dict[str, Any]]:
-    """
-    Group pages into batches for Azure OpenAI embedding API.
-    Adds 'batch_index' field to each page.
-    
-    Args:
-        pages: List of page dictionaries with token_count
-        max_tokens_per_batch: Maximum tokens per batch (default: 7500)
-        max_items_per_batch: Maximum items per batch (default: 2000)
-    
-    Returns:
-        Updated pages list with 'batch_index' field added to each page
-    """
-    current_batch = 0
-    current_tokens = 0
-    current_items = 0
-    
-    for page in pages:
-        page_tokens = page['token_count']
-        
-        # Check if adding this page would exceed limits
-        if (current_tokens + page_tokens > max_tokens_per_batch or 
-            current_items >= max_items_per_batch):
-            # Start new batch
-            current_batch += 1
-            current_tokens = 0
-            current_items = 0
-        
-        # Add page to current batch
-        page['batch_index'] = current_batch
-        current_tokens += page_tokens
-        current_items += 1
-    
-    return pages
-
-
+        return [len(text) // 4 for text in texts]
+    encoded = encoding.encode_ordinary_batch(texts, num_threads=os.cpu_count() or 1)
+    return [len(tokens) for tokens in encoded]
 
 
 @app.function_name("index_documents")
@@ -232,11 +220,13 @@ def index_documents_endpoint(req: func.HttpRequest) -> func.HttpResponse:
             return http_error("No documents provided", 400)
 
         # Normalize published_date across documents
-        normalized_dates: List[Optional[str]] = []
+        distinct_dates: set = set()
         for d in body:
             if "published_date" in d:
-                d["published_date"] = normalize_published_date_value(d.get("published_date"))
-                normalized_dates.append(d.get("published_date"))
+                normalized_date = normalize_published_date_value(d.get("published_date"))
+                d["published_date"] = normalized_date
+                if normalized_date is not None:
+                    distinct_dates.add(normalized_date)
         # Validate docs shape
         validation_errors = validate_documents_shape(body)
         if validation_errors:
@@ -255,7 +245,6 @@ def index_documents_endpoint(req: func.HttpRequest) -> func.HttpResponse:
         total_failed = 0
         warnings: List[str] = []
         # Add a warning if multiple distinct non-null published_date values are present
-        distinct_dates = {nd for nd in normalized_dates if nd is not None}
         if len(distinct_dates) > 1:
             warnings.append("Multiple distinct published_date values detected in request; documents will be indexed as provided.")
 
@@ -314,7 +303,24 @@ def index_documents_endpoint(req: func.HttpRequest) -> func.HttpResponse:
         return http_error(f"Internal server error: {str(e)}", 500)
 
 
-def split_markdown_by_pages(full_markdown: str, source_url: Optional[str] = None) -> List[Dict[str, Any]]:
+def _iter_page_sections(full_markdown: str) -> Iterator[str]:
+    """Yield the sections between PageBreak comments one at a time."""
+    start = 0
+    marker_length = len(_PAGE_BREAK_MARKER)
+    while True:
+        end = full_markdown.find(_PAGE_BREAK_MARKER, start)
+        if end == -1:
+            yield full_markdown[start:]
+            return
+        yield full_markdown[start:end]
+        start = end + marker_length
+
+
+def split_markdown_by_pages(
+    full_markdown: str,
+    source_url: Optional[str] = None,
+    base_document_id: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], int]:
     """
     Split the full markdown content by page breaks using HTML comments.
     Document Intelligence includes <!-- PageBreak --> comments to mark page boundaries.
@@ -322,43 +328,66 @@ def split_markdown_by_pages(full_markdown: str, source_url: Optional[str] = None
     Args:
         full_markdown: The full markdown content with page break comments
         source_url: Optional source URL for generating document IDs
+        base_document_id: Optional precomputed base document ID (takes precedence over source_url)
         
     Returns:
-        List of dictionaries with page_number, markdown_content, token_count, and document_id
+        Tuple of (pages, total_tokens) where pages is a list of dictionaries with document_id,
+        page_number, markdown_content, token_count, and batch_index (pages grouped under
+        Azure OpenAI embedding API limits) and total_tokens is the sum of page token counts
     """
-    # Split by PageBreak comments
-    page_sections = full_markdown.split('<!-- PageBreak -->')
-    
-    pages = []
-    base_id = generate_base_document_id(source_url)
+    page_contents = []
+    base_id = base_document_id or generate_base_document_id(source_url)
 
-    for i, section in enumerate(page_sections):
-        if not section.strip():
+    # Walk PageBreak comments lazily instead of materializing a list of all sections
+    for i, section in enumerate(_iter_page_sections(full_markdown)):
+        # Skip blank sections without allocating a stripped copy
+        if not section or section.isspace():
             continue
 
         # Extract page number from PageNumber comment if present
         page_number = i + 1  # Default fallback
-        page_number_match = re.search(r'<!-- PageNumber="(\d+)" -->', section)
+        page_number_match = _PAGE_NUMBER_RE.search(section)
         if page_number_match:
             page_number = int(page_number_match.group(1))
 
         # Clean up the content by removing page metadata comments
-        content = section.strip()
-        content = re.sub(r'<!-- (PageNumber|PageHeader|PageFooter)="[^"]*" -->\s*', '', content)
-        content = content.strip()
+        content = _PAGE_METADATA_RE.sub('', section).strip()
 
         if content:  # Only add non-empty pages
-            pages.append({
-                "document_id": generate_chunk_id_from_base(base_id, page_number),
-                "page_number": page_number,
-                "markdown_content": content,
-                "token_count": count_tokens(content)
-            })
-    
-    # Group pages into batches for embedding API
-    pages = group_pages_for_batch_embedding(pages)
-    
-    return pages
+            page_contents.append((page_number, content))
+
+    # Tokenize all pages in a single batched call
+    token_counts = count_tokens_batch([content for _, content in page_contents])
+
+    # Build pages and group them into batches for the embedding API in the same pass
+    pages: List[Dict[str, Any]] = [None] * len(page_contents)
+    # Bind loop-invariant globals locally; the loop runs once per page
+    max_tokens = EMBEDDING_BATCH_MAX_TOKENS
+    max_items = EMBEDDING_BATCH_MAX_ITEMS
+    chunk_id = generate_chunk_id_from_base
+    current_batch = 0
+    current_tokens = 0
+    current_items = 0
+    total_tokens = 0
+    for idx, ((page_number, content), page_tokens) in enumerate(zip(page_contents, token_counts)):
+        # Start a new batch if adding this page would exceed limits
+        if current_tokens + page_tokens > max_tokens or current_items >= max_items:
+            current_batch += 1
+            current_tokens = 0
+            current_items = 0
+
+        pages[idx] = {
+            "document_id": chunk_id(base_id, page_number),
+            "page_number": page_number,
+            "markdown_content": content,
+            "token_count": page_tokens,
+            "batch_index": current_batch
+        }
+        current_tokens += page_tokens
+        current_items += 1
+        total_tokens += page_tokens
+
+    return pages, total_tokens
 
 
 @app.function_name("generate_document_id_endpoint")
@@ -402,16 +431,12 @@ def generate_document_id_endpoint(req: func.HttpRequest) -> func.HttpResponse:
         
     except Exception as e:
         logging.error(f"Error generating document ID: {e}")
-        return func.HttpResponse(
-            json.dumps({"error": f"Internal server error: {str(e)}"}),
-            status_code=500,
-            mimetype="application/json"
-        )
+        return http_error(f"Internal server error: {str(e)}", 500)
 
 
 @app.function_name("process_document_to_markdown")
 @app.route(route="process-document", methods=["POST"])
-def process_document_to_markdown(req: func.HttpRequest) -> func.HttpResponse:
+async def process_document_to_markdown(req: func.HttpRequest) -> func.HttpResponse:
     """
     Azure Function that processes document binary data and returns page-split markdown with document-level analysis.
     
@@ -429,12 +454,10 @@ def process_document_to_markdown(req: func.HttpRequest) -> func.HttpResponse:
         # Get optional source URL parameter
         source_url = req.params.get('source_url')
 
-        # Validate request
-        if not req.get_body():
-            return http_error("Request body is empty. Please provide document binary data.", 400)
-
-        # Get document binary data
+        # Get and validate document binary data
         document_bytes = req.get_body()
+        if not document_bytes:
+            return http_error("Request body is empty. Please provide document binary data.", 400)
         logging.info(f"Received document of size: {len(document_bytes)} bytes")
 
         # Get Document Intelligence client
@@ -443,39 +466,42 @@ def process_document_to_markdown(req: func.HttpRequest) -> func.HttpResponse:
         # Analyze document with Layout model and markdown output
         logging.info("Starting document analysis with Document Intelligence")
 
-        # Create document stream from binary data
-        document_stream = io.BytesIO(document_bytes)
-
-        # Analyze document using Layout model with markdown output
-        poller = client.begin_analyze_document(
+        # Analyze document using Layout model with markdown output (the SDK accepts bytes directly)
+        poller = await client.begin_analyze_document(
             model_id="prebuilt-layout",
-            body=document_stream,
+            body=document_bytes,
             output_content_format="markdown"
         )
 
-        # Wait for completion
-        result = poller.result()
+        # Wait for completion without blocking the worker's event loop
+        result = await poller.result()
         logging.info("Document analysis completed successfully")
 
         # Get the full markdown content
-        full_markdown = result.content if hasattr(result, 'content') else ""
+        full_markdown = getattr(result, 'content', None) or ""
 
-        # Split markdown content by page breaks (using HTML comments)
-        pages = split_markdown_by_pages(full_markdown, source_url)
+        # Compute the base document ID once for the pages and the document summary
+        base_document_id = generate_base_document_id(source_url)
+
+        # Split markdown content by page breaks (CPU-bound tokenization runs off the event loop)
+        pages, total_tokens = await asyncio.to_thread(
+            split_markdown_by_pages, full_markdown, base_document_id=base_document_id
+        )
 
-        # Analyze document content for document-level attributes
+        # Analyze document content for document-level attributes (documents with no page
+        # content, e.g. scanned images or blank PDFs, take the skipped_small path)
         try:
             logging.info("Starting document analysis for summary and attributes")
-            document_summary = analyze_document_content(full_markdown, pages)
-            document_summary["base_document_id"] = generate_base_document_id(source_url)
+            document_summary = await analyze_document_content_async(full_markdown, pages, total_tokens)
+            document_summary["base_document_id"] = base_document_id
             logging.info("Document analysis completed successfully")
         except Exception as e:
             logging.warning(f"Document analysis failed: {e}")
             # Fallback: basic summary with error info
             document_summary = {
-                "base_document_id": generate_base_document_id(source_url),
+                "base_document_id": base_document_id,
                 "total_pages": len(pages),
-                "total_tokens": sum(page["token_count"] for page in pages),
+                "total_tokens": total_tokens,
                 "summary": None,
                 "key_topics": [],
                 "document_type": "Unknown",
@@ -1,17 +1,22 @@
-import json
 import logging
 import os
 import re
 import datetime
 from typing import Any, Dict, List, Optional
 
-from azure.identity import DefaultAzureCredential
+import orjson
+
 from azure.core.credentials import AzureKeyCredential
 from azure.search.documents import SearchClient
 
+from auth import get_default_credential
+
 
 _SEARCH_CLIENT: Optional[SearchClient] = None
 
+# Embedding dimensions expected by the index 'vector' field
+_EXPECTED_VECTOR_DIM = 1536
+
 
 def get_search_client() -> SearchClient:
     """Return a cached Azure AI Search SearchClient. Prefer Managed Identity (RBAC), fallback to API key.
@@ -32,7 +37,7 @@ def get_search_client() -> SearchClient:
 
     # Try DefaultAzureCredential first (requires Search Index Data Contributor/Reader roles as applicable)
     try:
-        credential = DefaultAzureCredential()
+        credential = get_default_credential()
         _SEARCH_CLIENT = SearchClient(endpoint=endpoint, index_name=index_name, credential=credential)
         return _SEARCH_CLIENT
     except Exception as e:
@@ -51,7 +56,10 @@ def get_search_client() -> SearchClient:
 def estimate_json_size_bytes(obj: Any) -> int:
     """Rough estimate of JSON size of an object in bytes."""
     try:
-        return len(json.dumps(obj, ensure_ascii=False).encode("utf-8"))
+        serialized_bytes = orjson.dumps(obj)
+        # orjson output is compact; add one byte per ',' and ':' to cover the
+        # separator spaces of the stdlib encoder so the estimate stays an upper bound
+        return len(serialized_bytes) + serialized_bytes.count(b",") + serialized_bytes.count(b":")
     except Exception:
         return 0
 
@@ -64,8 +72,10 @@ def chunk_documents_for_indexing(
     current: List[Dict[str, Any]] = []
     current_bytes = 0
 
-    for doc in docs:
-        doc_bytes = estimate_json_size_bytes(doc)
+    # Size every document in one pass before packing
+    sizes = [estimate_json_size_bytes(doc) for doc in docs]
+
+    for doc, doc_bytes in zip(docs, sizes):
         if (len(current) + 1 > max_docs) or (current_bytes + doc_bytes > max_bytes and current):
             batches.append(current)
             current = []
@@ -81,19 +91,39 @@ def chunk_documents_for_indexing(
 def validate_documents_shape(docs: List[Dict[str, Any]]) -> List[str]:
     """Basic validation: ensure id exists; optional vector length (1536) check if provided."""
     errors: List[str] = []
+    append = errors.append
     for i, d in enumerate(docs):
-        if "id" not in d or not d["id"]:
-            errors.append(f"Document at index {i} is missing required 'id'.")
-        if "vector" in d and d["vector"] is not None:
-            vec = d["vector"]
+        get = d.get
+        if not get("id"):
+            append(f"Document at index {i} is missing required 'id'.")
+        vec = get("vector")
+        if vec is not None:
             if not isinstance(vec, list):
-                errors.append(f"Document id {d.get('id')} 'vector' must be a list of floats.")
-            else:
-                if len(vec) != 1536:
-                    errors.append(f"Document id {d.get('id')} 'vector' length is {len(vec)}, expected 1536.")
+                append(f"Document id {get('id')} 'vector' must be a list of floats.")
+            elif len(vec) != _EXPECTED_VECTOR_DIM:
+                append(f"Document id {get('id')} 'vector' length is {len(vec)}, expected {_EXPECTED_VECTOR_DIM}.")
     return errors
 
 
+# Values treated as "no date"; includes "" so the empty check is the same lookup
+_DATE_PLACEHOLDERS = frozenset({"00-00-0000", "0000-00-00", "00/00/0000", ""})
+_ISO_DATETIME_RE = re.compile(r"^\d{4}-\d{2}-\d{2}T")
+_ISO_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+# Day fields also accept strptime's space-padded form (e.g. ' 5')
+_YMD_SLASH_RE = re.compile(r"^(\d{4})/(\d{1,2})/(\d{1,2}| [1-9])$")
+# MM-DD-YYYY, DD-MM-YYYY, MM/DD/YYYY, DD/MM/YYYY (same separator on both sides)
+_NUMERIC_DATE_RE = re.compile(r"^(\d{1,2})([-/])(\d{1,2}| [1-9])\2(\d{4})$")
+
+
+def _iso_date_or_none(year: int, month: int, day: int) -> Optional[str]:
+    """Return 'YYYY-MM-DDT00:00:00Z' for a valid calendar date, else None."""
+    try:
+        datetime.date(year, month, day)
+    except ValueError:
+        return None
+    return f"{year:04d}-{month:02d}-{day:02d}T00:00:00Z"
+
+
 def normalize_published_date_value(val: Any) -> Optional[str]:
     """Normalize published_date to ISO 8601 or None for placeholders.
 
@@ -109,37 +139,26 @@ def normalize_published_date_value(val: Any) -> Optional[str]:
         return None
     if isinstance(val, str):
         s = val.strip()
-        if not s:
-            return None
-        if s in ("00-00-0000", "0000-00-00", "00/00/0000"):
+        if s in _DATE_PLACEHOLDERS:
             return None
-        if re.match(r"^\d{4}-\d{2}-\d{2}T", s):
+        if _ISO_DATETIME_RE.match(s):
             return s
-        # Try strict ISO date without time first (YYYY-MM-DD)
-        if re.match(r"^\d{4}-\d{2}-\d{2}$", s):
+        # Strict ISO date without time (YYYY-MM-DD)
+        if _ISO_DATE_RE.match(s):
             return f"{s}T00:00:00Z"
-        # Attempt to parse common non-ISO formats and normalize to Zulu time
-        date_formats = (
-            "%Y/%m/%d",  # 2025/01/31
-            "%m-%d-%Y",  # 01-31-2025
-            "%d-%m-%Y",  # 31-01-2025
-            "%m/%d/%Y",  # 01/31/2025
-            "%d/%m/%Y",  # 31/01/2025
-        )
-        for fmt in date_formats:
-            try:
-                dt = datetime.datetime.strptime(s, fmt)
-                dt = dt.replace(tzinfo=datetime.timezone.utc)
-                return dt.isoformat().replace("+00:00", "Z")
-            except ValueError:
-                pass
-        # Ambiguous numeric with dashes where both mm and dd <= 12: default to MM-DD-YYYY
-        if re.match(r"^\d{2}-\d{2}-\d{4}$", s):
-            try:
-                dt = datetime.datetime.strptime(s, "%m-%d-%Y").replace(tzinfo=datetime.timezone.utc)
-                return dt.isoformat().replace("+00:00", "Z")
-            except ValueError:
-                return None
+        # Dispatch common non-ISO formats by shape, then validate the single candidate
+        # (or two for ambiguous day/month order) instead of trying every strptime format
+        m = _YMD_SLASH_RE.match(s)
+        if m:
+            return _iso_date_or_none(int(m.group(1)), int(m.group(2)), int(m.group(3)))
+        m = _NUMERIC_DATE_RE.match(s)
+        if m:
+            first, second, year = int(m.group(1)), int(m.group(3)), int(m.group(4))
+            # Assume MM-DD-YYYY when ambiguous, fall back to DD-MM-YYYY (month is never space-padded)
+            result = _iso_date_or_none(year, first, second)
+            if result is None and not m.group(3).startswith(" "):
+                result = _iso_date_or_none(year, second, first)
+            return result
         # If we reach here, we couldn't confidently parse the string; return None to avoid index errors
         return None
     if isinstance(val, datetime.datetime):
@@ -1,4 +1,5 @@
 from dotenv import load_dotenv
+from azure.identity.aio import DefaultAzureCredential
 import os
 
 load_dotenv()
@@ -17,3 +18,7 @@ class Config:
     # Microsoft Entra (Azure AD) token validation settings
     ENTRA_TENANT_ID = os.getenv('ENTRA_TENANT_ID')  # Required
     ENTRA_AUDIENCE = os.getenv('ENTRA_AUDIENCE')    # e.g., api://<client-id> or the app's client ID
+
+    # Shared async credential for Azure SDK clients (blob download, search) so they
+    # share one managed identity probe and token cache
+    CREDENTIAL = DefaultAzureCredential()
@@ -3,17 +3,23 @@ from fastapi.responses import JSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import logging
 import json
+import asyncio
+import hashlib
+import time
+from contextlib import asynccontextmanager
 from starlette.responses import Response
 from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import os
-from azure.identity import DefaultAzureCredential
+from typing import Optional
 from azure.storage.blob.aio import BlobServiceClient
+import orjson
 
 from ag_ui.core import RunAgentInput
 from pydantic_ai.ag_ui import run_ag_ui, SSE_CONTENT_TYPE
-from models.request_context import RequestContext
+from models.request_context import EMPTY_CONTEXT, RequestContext
 from agents.search_agent import create_search_agent
+from tools.search_tools import close_search_client
 from config import Config
 import logfire
 import jwt
@@ -28,15 +34,43 @@ logfire.instrument_httpx(capture_all=True)
 # Use uvicorn's configured logger so messages appear in dev/server logs
 logger = logging.getLogger("uvicorn.error")
 
-# Create agent and blob service client
+# Create agent; the blob service client is opened and closed by the app lifespan
 agent = create_search_agent()
 
-blob_service_client = BlobServiceClient(
-    account_url=f"https://{Config.AZURE_STORAGE_ACCOUNT_NAME}.blob.core.windows.net",
-    credential=DefaultAzureCredential()
-) if Config.AZURE_STORAGE_ACCOUNT_NAME else None
+blob_service_client: Optional[BlobServiceClient] = None
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global blob_service_client
+    # Fetch the JWKS once at startup so the first authenticated request is a cache hit
+    if Config.ENTRA_TENANT_ID:
+        try:
+            await asyncio.to_thread(_jwks_client().get_signing_keys)
+        except Exception as e:
+            logger.warning("JWKS prefetch failed; keys will be fetched on first request: %s", e)
+
+    if Config.AZURE_STORAGE_ACCOUNT_NAME:
+        blob_service_client = BlobServiceClient(
+            account_url=f"https://{Config.AZURE_STORAGE_ACCOUNT_NAME}.blob.core.windows.net",
+            credential=Config.CREDENTIAL,
+        )
+        # Open the connection pool and acquire a token before the first download
+        try:
+            await blob_service_client.get_account_information()
+        except Exception as e:
+            logger.warning("Blob client warm-up failed; connecting on first download: %s", e)
+
+    try:
+        yield
+    finally:
+        if blob_service_client is not None:
+            await blob_service_client.close()
+            blob_service_client = None
+        # Close the search client and the shared credential so their aiohttp sessions don't leak
+        await close_search_client()
+        await Config.CREDENTIAL.close()
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS configuration to allow Authorization header from the frontend
 frontend_origins = os.getenv("FRONTEND_ORIGINS")
@@ -60,18 +94,69 @@ async def healthz():
 
 bearer_scheme = HTTPBearer(auto_error=False)
 
+# Header values never written to logs
+_SENSITIVE_HEADERS = frozenset({"authorization", "cookie"})
+
 @lru_cache(maxsize=1)
 def _jwks_client() -> PyJWKClient:
     if not Config.ENTRA_TENANT_ID:
         raise RuntimeError("ENTRA_TENANT_ID is not configured")
     jwks_url = f"https://login.microsoftonline.com/{Config.ENTRA_TENANT_ID}/discovery/v2.0/keys"
-    return PyJWKClient(jwks_url)
+    # Keep the key set and resolved signing keys in memory for an hour
+    return PyJWKClient(jwks_url, cache_keys=True, lifespan=3600)
+
+# Validated claims keyed by sha256(token) so raw tokens are never held in memory.
+# Entries live for at most _TOKEN_CACHE_TTL_SECONDS and never past the token's exp claim,
+# and each entry is served _TOKEN_CACHE_CREDITS times before the token is re-verified.
+_TOKEN_CACHE_TTL_SECONDS = 60
+_TOKEN_CACHE_MAX_SIZE = 10000
+_TOKEN_CACHE_CREDITS = 10
+_token_cache: dict[bytes, tuple[float, dict, int]] = {}
+
+def _token_key(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+def _cached_claims(key: bytes, now: float) -> dict | None:
+    cached = _token_cache.get(key)
+    if cached is None:
+        return None
+    expires_at, claims, credits = cached
+    if expires_at <= now or credits <= 0:
+        # Expired or out of credits: drop it so the caller re-verifies
+        _token_cache.pop(key, None)
+        return None
+    _token_cache[key] = (expires_at, claims, credits - 1)
+    return claims
+
+def _cache_claims(key: bytes, claims: dict, now: float) -> None:
+    expires_at = min(now + _TOKEN_CACHE_TTL_SECONDS, float(claims["exp"]))
+    if expires_at <= now:
+        return
+    if len(_token_cache) >= _TOKEN_CACHE_MAX_SIZE:
+        # Drop expired entries first, then the oldest if still full
+        for k in [k for k, (exp, _, _) in _token_cache.items() if exp <= now]:
+            del _token_cache[k]
+        if len(_token_cache) >= _TOKEN_CACHE_MAX_SIZE:
+            del _token_cache[next(iter(_token_cache))]
+    _token_cache[key] = (expires_at, claims, _TOKEN_CACHE_CREDITS)
 
 def _validate_token(token: str):
+    key = _token_key(token)
+    now = time.time()
+    claims = _cached_claims(key, now)
+    if claims is not None:
+        return claims
+
+    decoded = _decode_token(token)
+    _cache_claims(key, decoded, now)
+    return decoded
+
+def _decode_token(token: str) -> dict:
     if not Config.ENTRA_AUDIENCE:
         raise RuntimeError("ENTRA_AUDIENCE is not configured")
     jwks_client = _jwks_client()
-    signing_key = jwks_client.get_signing_key_from_jwt(token)
+    # Resolve the key from the header's kid alone; get_signing_key_from_jwt decodes the whole token first
+    signing_key = jwks_client.get_signing_key(jwt.get_unverified_header(token).get("kid"))
     # Validate standard claims; issuer format for v2 endpoint
     issuer = f"https://login.microsoftonline.com/{Config.ENTRA_TENANT_ID}/v2.0"
     decoded = jwt.decode(
@@ -91,6 +176,16 @@ async def auth_middleware(request: Request, call_next):
     if request.method == "OPTIONS" or request.url.path == "/healthz":
         return await call_next(request)
 
+    # Fast path: a recently verified token skips HTTPBearer and re-verification
+    authorization = request.headers.get("authorization")
+    if authorization:
+        scheme, _, token = authorization.partition(" ")
+        if scheme.lower() == "bearer" and token:
+            claims = _cached_claims(_token_key(token), time.time())
+            if claims is not None:
+                request.state.user_claims = claims
+                return await call_next(request)
+
     credentials: HTTPAuthorizationCredentials | None = await bearer_scheme(request)
     if credentials is None or credentials.scheme.lower() != "bearer":
         return JSONResponse(
@@ -115,20 +210,22 @@ async def auth_middleware(request: Request, call_next):
 
 @app.post("/")
 async def root(request: Request) -> Response:
-    # Log inbound request headers (with sensitive values redacted)
-    headers = {k: v for k, v in request.headers.items()}
-    redacted = {k: ("[REDACTED]" if k.lower() in {"authorization", "cookie"} else v) for k, v in headers.items()}
-    logger.info("Inbound request headers: %s", redacted)
+    # Log inbound request headers (with sensitive values redacted) only when debugging
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "Inbound request headers: %s",
+            {k: ("[REDACTED]" if k.lower() in _SENSITIVE_HEADERS else v) for k, v in request.headers.items()},
+        )
     
     body = await request.body()
-    run_input = RunAgentInput.model_validate_json(body)
+    run_input = RunAgentInput.model_validate(orjson.loads(body))
     
     # Extract forwarded_props and create per-request dependencies
-    forwarded_props_data = run_input.forwarded_props if hasattr(run_input, 'forwarded_props') and run_input.forwarded_props else {}
-    deps = RequestContext(forwarded_props=forwarded_props_data)
+    forwarded_props_data = getattr(run_input, 'forwarded_props', None)
+    deps = RequestContext(forwarded_props=forwarded_props_data) if forwarded_props_data else EMPTY_CONTEXT
     
-    accept = request.headers.get('accept', SSE_CONTENT_TYPE)
-    event_stream = run_ag_ui(agent, run_input, accept=accept, deps=deps)
+    # The response is always SSE, so encode events for it regardless of the Accept header
+    event_stream = run_ag_ui(agent, run_input, accept=SSE_CONTENT_TYPE, deps=deps)
     
     return StreamingResponse(event_stream, media_type=SSE_CONTENT_TYPE)
 
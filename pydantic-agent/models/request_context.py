@@ -4,6 +4,10 @@ from dataclasses import dataclass
 from typing import Dict, Any
 
 
-@dataclass
+@dataclass(slots=True)
 class RequestContext:
     forwarded_props: Dict[str, Any]
+
+
+# Shared context for requests without forwarded_props; treat as read-only
+EMPTY_CONTEXT = RequestContext(forwarded_props={})
@@ -5,20 +5,22 @@ import logging
 from typing import Any, Optional
 from pydantic_ai import RunContext
 from models.request_context import RequestContext
+from config import Config
 
 from azure.search.documents.aio import SearchClient
-from azure.identity.aio import DefaultAzureCredential
 from azure.core.exceptions import AzureError
+import orjson
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-logger = logging.getLogger(__name__)
+# Use uvicorn's configured logger, as main.py does, instead of reconfiguring the root logger
+logger = logging.getLogger("uvicorn.error")
 
 # Azure AI Search configuration
 AZURE_SEARCH_ENDPOINT = os.getenv("AZURE_SEARCH_ENDPOINT")
 AZURE_SEARCH_INDEX_NAME = os.getenv("AZURE_SEARCH_INDEX_NAME", "chunk_lg_index")
 AZURE_SEARCH_SEMANTIC_CONFIG = os.getenv("AZURE_SEARCH_SEMANTIC_CONFIG", "default-semantic-config")
 DEFAULT_CATEGORY_VALUE = os.getenv("DEFAULT_CATEGORY_VALUE", "all")
+# Normalized once; categories matching it search across all documents
+_NORMALIZED_DEFAULT_CATEGORY = (DEFAULT_CATEGORY_VALUE or "").strip().lower()
 
 # Log configuration on module load
 logger.debug(
@@ -26,14 +28,34 @@ logger.debug(
     'SET' if AZURE_SEARCH_ENDPOINT else 'NOT SET', AZURE_SEARCH_INDEX_NAME, AZURE_SEARCH_SEMANTIC_CONFIG, DEFAULT_CATEGORY_VALUE
 )
 
+# Search results go straight into the LLM prompt, so serialize them compactly
+def _to_json(data: Any) -> str:
+    return orjson.dumps(data).decode()
+
+# Download links are relative to this API (served by /api/download in main.py)
+_DOWNLOAD_ENDPOINT_BASE = "/api/download/"
+
+def _extract_download_endpoint(blob_storage_url: str, page_number: Any = None) -> str:
+    """Build custom API download endpoint from blob_storage_url with optional page fragment."""
+    url = (blob_storage_url or "").strip()
+    if not url:
+        return ""
+    # Drop query and fragment, then take the path after the host: container/blob/path
+    url = url.split("#", 1)[0].split("?", 1)[0]
+    scheme, sep, rest = url.partition("://")
+    path = (rest.partition("/")[2] if sep else url).lstrip('/')
+    if not path or '/' not in path:
+        return ""
+    if page_number is None or not str(page_number).strip():
+        return f"{_DOWNLOAD_ENDPOINT_BASE}{path}"
+    return f"{_DOWNLOAD_ENDPOINT_BASE}{path}#page={page_number}"
+
 # Initialize client
 _search_client: Optional[SearchClient] = None
 
 def _get_search_client() -> SearchClient:
     """Get or create Azure Search client."""
     global _search_client
-    logger.debug("Get or create Azure Search client")
-    
     if _search_client is None:
         logger.debug("Creating new Azure Search client")
         
@@ -47,17 +69,22 @@ def _get_search_client() -> SearchClient:
             _search_client = SearchClient(
                 endpoint=AZURE_SEARCH_ENDPOINT,
                 index_name=AZURE_SEARCH_INDEX_NAME,
-                credential=DefaultAzureCredential()
+                credential=Config.CREDENTIAL
             )
             logger.debug("Azure Search client created")
         except Exception as e:
             logger.error("Failed to create Azure Search client: %s", e)
             raise
-    else:
-        logger.debug("Using existing Azure Search client")
-    
+
     return _search_client
 
+async def close_search_client() -> None:
+    """Close the Azure Search client, if one was created, and release its HTTP session."""
+    global _search_client
+    if _search_client is not None:
+        await _search_client.close()
+        _search_client = None
+
 async def _perform_hybrid_semantic_search(query: str, category: Optional[str]) -> str:
     """Perform hybrid semantic search using Azure AI Search with integrated vectorization."""
     logger.debug("Hybrid search: query='%s', category='%s'", query, category)
@@ -65,10 +92,9 @@ async def _perform_hybrid_semantic_search(query: str, category: Optional[str]) -
     try:
         search_client = _get_search_client()
         # Build category filter (generic vs filtered search)
-        normalized_default = (DEFAULT_CATEGORY_VALUE or "").strip().lower()
         normalized_category = (category or "").strip()
         category_filter: Optional[str]
-        if not normalized_category or normalized_category.lower() == normalized_default:
+        if not normalized_category or normalized_category.lower() == _NORMALIZED_DEFAULT_CATEGORY:
             category_filter = None
         else:
             safe_value = normalized_category.replace("'", "''")
@@ -94,7 +120,6 @@ async def _perform_hybrid_semantic_search(query: str, category: Optional[str]) -
         )
         
         # Convert search results to JSON format
-        logger.debug("Converting search results to JSON format")
         return await _convert_search_results_to_json(search_results, query, category)
         
     except AzureError as e:
@@ -106,29 +131,6 @@ async def _perform_hybrid_semantic_search(query: str, category: Optional[str]) -
 
 async def _convert_search_results_to_json(search_results, query: str, category: Optional[str]) -> str:
     """Convert search results to JSON format."""
-    import json
-    from urllib.parse import urlparse
-
-    logger.debug("Converting search results to JSON")
-
-    def _extract_download_endpoint(blob_storage_url: str, page_number: Any = None) -> str:
-        """Build custom API download endpoint from blob_storage_url with optional page fragment."""
-        try:
-            url = (blob_storage_url or "").strip()
-            if not url:
-                return ""
-            parsed = urlparse(url)
-            path = parsed.path.lstrip('/')  # container/blob/path
-            if not path or '/' not in path:
-                return ""
-            # api_hostname = os.getenv('API_HOSTNAME', 'http://localhost:8000').rstrip('/')
-            base_url = f"/api/download/{path}"
-            if page_number is not None and str(page_number).strip():
-                base_url += f"#page={page_number}"
-            return base_url
-        except Exception:
-            return ""
-
     try:
         result_data = {
             "query": query,
@@ -137,29 +139,29 @@ async def _convert_search_results_to_json(search_results, query: str, category:
         }
 
         # Extract documents
-        logger.debug("Extracting search result documents")
+        documents = result_data["documents"]
+        append_document = documents.append
         async for result in search_results:
-            if len(result_data["documents"]) >= 10:  # Limit to top 10 results
+            if len(documents) >= 10:  # Limit to top 10 results
                 break
 
             # Extract document data
-            doc_data = {
-                "id": result.get('id', ''),
-                "content": result.get('content', ''),
-                "api_download_endpoint": _extract_download_endpoint(result.get('blob_storage_url', ''), result.get('page_number', '')),
-                "page_number": result.get('page_number', ''),
-                "category": result.get('category', ''),
-                "search_score": result.get('@search.score', 0),
-                "reranker_score": result.get('@search.rerankerScore', 0)
-            }
-
-            result_data["documents"].append(doc_data)
-
-        logger.debug("Extracted %d documents", len(result_data["documents"]))
+            get = result.get
+            page_number = get('page_number', '')
+            append_document({
+                "id": get('id', ''),
+                "content": get('content', ''),
+                "api_download_endpoint": _extract_download_endpoint(get('blob_storage_url', ''), page_number),
+                "page_number": page_number,
+                "category": get('category', ''),
+                "search_score": get('@search.score', 0),
+                "reranker_score": get('@search.rerankerScore', 0)
+            })
 
         # Convert to JSON string
-        json_result = json.dumps(result_data, indent=2, ensure_ascii=False)
-        logger.debug("JSON result length: %d", len(json_result))
+        json_result = _to_json(result_data)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Extracted %d documents, JSON result length: %d", len(documents), len(json_result))
         return json_result
 
     except Exception as e:
@@ -171,7 +173,7 @@ async def _convert_search_results_to_json(search_results, query: str, category:
             "error": str(e),
             "documents": []
         }
-        return json.dumps(error_result, indent=2)
+        return _to_json(error_result)
 
 async def perform_search(ctx: RunContext[RequestContext], query: str) -> str:
     """Perform hybrid semantic search using Azure AI Search with integrated vectorization."""
@@ -188,8 +190,4 @@ async def perform_search(ctx: RunContext[RequestContext], query: str) -> str:
         logger.error("Azure AI Search not configured. AZURE_SEARCH_ENDPOINT environment variable not set.")
         raise ValueError("Azure AI Search not configured. Check AZURE_SEARCH_ENDPOINT environment variable.")
 
-    logger.debug("Azure AI Search configuration validated")
-
-    result = await _perform_hybrid_semantic_search(query, category)
-    logger.debug("Search completed. Result length: %d", len(result))
-    return result
+    return await _perform_hybrid_semantic_search(query, category)